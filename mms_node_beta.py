@@ -5,19 +5,167 @@ Second client for testing P2P communication
 
 import socket
 import requests
-import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import orjson
+import asyncio
+import atexit
+import logging
+import logging.handlers
+import queue
+import sched
+import struct
+import sys
 import threading
 import time
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+log = logging.getLogger('mms')
+
+def setup_logging():
+    """Attach a queued handler to the 'mms' logger; a listener thread does the stdout I/O"""
+    if log.handlers:
+        return log
+    
+    log.setLevel(logging.INFO)
+    log.propagate = False
+    log_queue = queue.Queue(-1)
+    log.addHandler(logging.handlers.QueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(log_queue, logging.StreamHandler(sys.stdout))
+    listener.start()
+    atexit.register(listener.stop)
+    return log
+
+# Configuration
+HEARTBEAT_INTERVAL = 15  # seconds
+DISCOVERY_INTERVAL = 20  # seconds
+# Fail fast on an unreachable server so the heartbeat cadence doesn't drift
+HTTP_TIMEOUT = (0.5, 3)  # (connect, read) seconds
+REGISTER_TIMEOUT = (0.5, 10)  # (connect, read) seconds
+
+# P2P wire format (JSON stays on the HTTP control plane only):
+# u16 src_len | u16 dst_len | u8 type_tag | u32 payload_len | u64 timestamp_ns | src | dst | payload
+FRAME_HEADER = struct.Struct('<HHBIQ')
+MESSAGE_TYPES = {'text': 1, 'ack': 2}
+MESSAGE_TYPE_NAMES = {tag: name for name, tag in MESSAGE_TYPES.items()}
+# Each frame travels behind a 4-byte big-endian length prefix
+LENGTH_PREFIX = struct.Struct('>I')
+MAX_FRAME_SIZE = 1024 * 1024  # bytes
+PEER_TIMEOUT = 10  # seconds
+# Inbound peers handled at once; connections beyond the cap are closed as
+# soon as they are accepted, so open sockets and tasks stay bounded
+MAX_PEER_CONNECTIONS = 16
+DROP_REPORT_INTERVAL = 10  # seconds between "peer limit reached" warnings
+
+def encode_frame(source, destination, message_type, payload):
+    """Pack a P2P message into one contiguous binary frame"""
+    src = source.encode('utf-8')
+    dst = destination.encode('utf-8')
+    if isinstance(payload, str):
+        payload = payload.encode('utf-8')
+    header = FRAME_HEADER.pack(
+        len(src), len(dst), MESSAGE_TYPES[message_type], len(payload), time.time_ns()
+    )
+    return b''.join((header, src, dst, payload))
+
+def decode_frame(frame):
+    """Unpack a frame built by encode_frame into a message dict"""
+    src_len, dst_len, type_tag, payload_len, timestamp_ns = FRAME_HEADER.unpack_from(frame)
+    view = memoryview(frame)
+    offset = FRAME_HEADER.size
+    source = str(view[offset:offset + src_len], 'utf-8')
+    offset += src_len
+    destination = str(view[offset:offset + dst_len], 'utf-8')
+    offset += dst_len
+    payload = str(view[offset:offset + payload_len], 'utf-8', 'replace')
+    return {
+        'source': source,
+        'destination': destination,
+        'type': MESSAGE_TYPE_NAMES.get(type_tag, 'unknown'),
+        'payload': payload,
+        'timestamp': datetime.fromtimestamp(timestamp_ns / 1e9)
+    }
+
+def recv_exact(sock, n):
+    """Read exactly n bytes, raising if the peer closes first"""
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise IOError("Connection closed mid-frame")
+        buf += chunk
+    return bytes(buf)
+
+def send_framed(sock, frame):
+    """Send a frame behind its length prefix"""
+    sock.sendall(LENGTH_PREFIX.pack(len(frame)) + frame)
+
+def recv_framed(sock):
+    """Receive one length-prefixed frame"""
+    (length,) = LENGTH_PREFIX.unpack(recv_exact(sock, LENGTH_PREFIX.size))
+    if length > MAX_FRAME_SIZE:
+        raise IOError(f"Frame too large: {length} bytes")
+    return recv_exact(sock, length)
+
+async def read_frame(reader):
+    """Receive one length-prefixed frame from an asyncio stream"""
+    header = await reader.readexactly(LENGTH_PREFIX.size)
+    (length,) = LENGTH_PREFIX.unpack(header)
+    if length > MAX_FRAME_SIZE:
+        raise IOError(f"Frame too large: {length} bytes")
+    return await reader.readexactly(length)
+
 class MeshNode:
     def __init__(self, node_id, server_url, listen_port=8002):
         self.node_id = node_id
         self.server_url = server_url
         self.listen_port = listen_port
         self.peers = {}
+        self._peer_version = None
         self.running = False
-        self.server_socket = None
+        self._server = None
+        self._loop = None
+        self._peer_slots = None
+        self._dropped_peers = 0
+        self._drop_report_at = 0.0
+        
+        # Signaling URLs are fixed for the node's lifetime; build them once
+        self._url_register = f"{server_url}/register"
+        self._url_hb = f"{server_url}/heartbeat/{quote(node_id, safe='')}"
+        self._url_disc = f"{server_url}/discover"
+        self._url_unreg = f"{server_url}/unregister"
+        
+        # Pooled HTTP session so heartbeat/discovery reuse a kept-alive connection
+        self.http = requests.Session()
+        self.http.headers['Connection'] = 'keep-alive'
+        # Retry connect failures and gateway errors, never read timeouts (read=0),
+        # so a request the server may still be processing isn't re-sent. The
+        # control POSTs are idempotent, so POST may retry on those statuses.
+        # Retry-After is ignored: a long value on a 503 would stall the shared
+        # scheduler thread and let the node expire.
+        adapter = HTTPAdapter(
+            pool_connections=2,
+            pool_maxsize=4,
+            max_retries=Retry(
+                total=2,
+                connect=2,
+                read=0,
+                backoff_factor=0.1,
+                status_forcelist=(502, 503, 504),
+                allowed_methods=frozenset(['GET', 'POST']),
+                raise_on_status=False,
+                respect_retry_after_header=False
+            )
+        )
+        self.http.mount('http://', adapter)
+        self.http.mount('https://', adapter)
+        
+        # One worker runs the listener, the other runs the heartbeat/discovery scheduler
+        self._exec = ThreadPoolExecutor(max_workers=2, thread_name_prefix="mms")
+        self._wakeup = threading.Event()
+        self._scheduler = sched.scheduler(time.monotonic, self._wakeup.wait)
         
     def start(self):
         """Start the mesh node"""
@@ -37,34 +185,39 @@ class MeshNode:
         self.running = True
         
         # Start listening for incoming connections
-        listener_thread = threading.Thread(target=self.listen_for_connections, daemon=True)
-        listener_thread.start()
-        
-        # Start heartbeat thread
-        heartbeat_thread = threading.Thread(target=self.send_heartbeat, daemon=True)
-        heartbeat_thread.start()
+        self._exec.submit(self.listen_for_connections)
         
-        # Start peer discovery thread
-        discovery_thread = threading.Thread(target=self.discover_peers, daemon=True)
-        discovery_thread.start()
+        # Schedule heartbeat and peer discovery on a single worker
+        self._scheduler.enter(0, 1, self._tick_heartbeat)
+        self._scheduler.enter(0, 1, self._tick_discover)
+        self._exec.submit(self._scheduler.run)
         
         return True
     
+    def _post(self, url, payload, timeout=HTTP_TIMEOUT):
+        """POST an orjson-encoded body on the pooled session"""
+        return self.http.post(
+            url,
+            data=orjson.dumps(payload),
+            headers={'Content-Type': 'application/json'},
+            timeout=timeout
+        )
+    
     def register(self):
         """Register this node with the signaling server"""
         try:
             print("🔄 Connecting to signaling server...")
-            response = requests.post(
-                f"{self.server_url}/register",
-                json={
+            response = self._post(
+                self._url_register,
+                {
                     'node_id': self.node_id,
                     'port': self.listen_port
                 },
-                timeout=10
+                timeout=REGISTER_TIMEOUT
             )
             
             if response.status_code == 201:
-                data = response.json()
+                data = orjson.loads(response.content)
                 print(f"✅ Registered successfully!")
                 print(f"   Public IP: {data['node_info']['ip_address']}")
                 print(f"   Port: {data['node_info']['port']}")
@@ -72,7 +225,7 @@ class MeshNode:
                 print(f"   for P2P connections to work across networks.\n")
                 return True
             else:
-                print(f"❌ Registration failed: {response.json()}")
+                print(f"❌ Registration failed: {orjson.loads(response.content)}")
                 return False
                 
         except requests.exceptions.ConnectionError:
@@ -84,110 +237,144 @@ class MeshNode:
             return False        
     
     def send_heartbeat(self):
-        """Send periodic heartbeat to signaling server"""
-        while self.running:
-            try:
-                response = requests.post(
-                    f"{self.server_url}/heartbeat",
-                    json={'node_id': self.node_id},
-                    timeout=10
-                )
-                
-                if response.status_code == 200:
-                    print(f"💓 Heartbeat sent [{datetime.now().strftime('%H:%M:%S')}]")
-                else:
-                    print(f"⚠️  Heartbeat failed: {response.json()}")
-                    
-            except Exception as e:
-                print(f"⚠️  Heartbeat error: {e}")
+        """Send a heartbeat to the signaling server"""
+        try:
+            # Bodyless route: no JSON either way, 204 on success
+            response = self.http.post(
+                self._url_hb,
+                timeout=HTTP_TIMEOUT
+            )
             
-            time.sleep(15)  # Send heartbeat every 15 seconds
+            if response.status_code == 204:
+                log.debug("💓 Heartbeat sent")
+            else:
+                log.warning("⚠️  Heartbeat failed: HTTP %s", response.status_code)
+                
+        except Exception as e:
+            log.warning("⚠️  Heartbeat error: %s", e)
     
     def discover_peers(self):
-        """Periodically discover peers from signaling server"""
-        while self.running:
-            try:
-                response = requests.post(
-                    f"{self.server_url}/discover",
-                    json={'node_id': self.node_id},
-                    timeout=10  
-                )
+        """Discover peers from the signaling server"""
+        try:
+            response = self._post(
+                self._url_disc,
+                {'node_id': self.node_id, 'since_version': self._peer_version}
+            )
+            
+            if response.status_code == 200:
+                data = orjson.loads(response.content)
+                if data.get('unchanged'):
+                    return
                 
-                if response.status_code == 200:
-                    data = response.json()
-                    new_peers = data['peers']
+                new_peers = data['peers']
+                
+                if new_peers:
+                    added = [peer for peer in new_peers if peer['node_id'] not in self.peers]
+                    self.peers.update({peer['node_id']: peer for peer in added})
                     
-                    if new_peers:
-                        print(f"\n🔍 Discovered {len(new_peers)} peer(s):")
-                        for peer in new_peers:
-                            peer_id = peer['node_id']
-                            if peer_id not in self.peers:
-                                self.peers[peer_id] = peer
-                                print(f"   ➕ {peer_id} @ {peer['ip_address']}:{peer['port']}")
-                    else:
-                        print(f"\n🔍 No peers discovered yet...")
-                        
-            except Exception as e:
-                print(f"⚠️  Discovery error: {e}")
-            
-            time.sleep(20)  # Discover peers every 20 seconds
+                    # One log record (and one write) for the whole batch
+                    if log.isEnabledFor(logging.INFO):
+                        lines = [f"\n🔍 Discovered {len(new_peers)} peer(s):"]
+                        lines.extend(
+                            f"   ➕ {peer['node_id']} @ {peer['ip_address']}:{peer['port']}"
+                            for peer in added
+                        )
+                        log.info('\n'.join(lines))
+                else:
+                    log.debug("\n🔍 No peers discovered yet...")
+                
+                # Only remember the version once its peer list has been merged
+                self._peer_version = data.get('version')
+                    
+        except Exception as e:
+            log.warning("⚠️  Discovery error: %s", e)
+    
+    def _tick_heartbeat(self):
+        """Scheduler task: heartbeat, then re-enqueue while running"""
+        if not self.running:
+            return
+        self.send_heartbeat()
+        if self.running:
+            self._scheduler.enter(HEARTBEAT_INTERVAL, 1, self._tick_heartbeat)
+    
+    def _tick_discover(self):
+        """Scheduler task: discovery, then re-enqueue while running"""
+        if not self.running:
+            return
+        self.discover_peers()
+        if self.running:
+            self._scheduler.enter(DISCOVERY_INTERVAL, 1, self._tick_discover)
     
     def listen_for_connections(self):
         """Listen for incoming P2P connections"""
         try:
-            self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            self.server_socket.bind(('0.0.0.0', self.listen_port))
-            self.server_socket.listen(5)
-            
-            print(f"👂 Listening for connections on port {self.listen_port}...\n")
-            
-            while self.running:
-                try:
-                    self.server_socket.settimeout(1.0)
-                    client_socket, address = self.server_socket.accept()
-                    print(f"\n📥 Incoming connection from {address}")
-                    
-                    # Handle connection in separate thread
-                    handler = threading.Thread(
-                        target=self.handle_peer_connection,
-                        args=(client_socket, address),
-                        daemon=True
-                    )
-                    handler.start()
-                    
-                except socket.timeout:
-                    continue
-                except Exception as e:
-                    if self.running:
-                        print(f"⚠️  Connection error: {e}")
-                        
+            asyncio.run(self._serve())
         except Exception as e:
             print(f"❌ Listen error: {e}")
     
-    def handle_peer_connection(self, client_socket, address):
+    async def _serve(self):
+        """Accept peers on a single event loop until stop() closes the server"""
+        self._loop = asyncio.get_running_loop()
+        self._peer_slots = asyncio.Semaphore(MAX_PEER_CONNECTIONS)
+        self._server = await asyncio.start_server(
+            self._on_peer, '0.0.0.0', self.listen_port, reuse_address=True
+        )
+        
+        print(f"👂 Listening for connections on port {self.listen_port}...\n")
+        
+        async with self._server:
+            if not self.running:
+                return
+            try:
+                await self._server.serve_forever()
+            except asyncio.CancelledError:
+                pass
+    
+    async def _on_peer(self, reader, writer):
         """Handle incoming peer connection"""
+        # asyncio transports already set TCP_NODELAY on accepted sockets
+        address = writer.get_extra_info('peername')
+        log.debug("\n📥 Incoming connection from %s", address)
+        
+        if self._peer_slots.locked():
+            writer.close()
+            # Count drops and warn at most once per interval so a flood
+            # can't fill the log queue at the accept rate
+            log.debug("Peer limit reached, dropping %s", address)
+            self._dropped_peers += 1
+            now = time.monotonic()
+            if now >= self._drop_report_at:
+                log.warning(
+                    "⚠️  Peer limit reached, dropped %d connection(s)", self._dropped_peers
+                )
+                self._dropped_peers = 0
+                self._drop_report_at = now + DROP_REPORT_INTERVAL
+            return
+        
+        # Never blocks: a slot is free, checked just above
+        await self._peer_slots.acquire()
         try:
-            # Receive data
-            data = client_socket.recv(4096).decode('utf-8')
+            # Receive data; one deadline covers the whole frame
+            data = await asyncio.wait_for(read_frame(reader), PEER_TIMEOUT)
+            
+            message = decode_frame(data)
+            log.info(
+                "\n📨 Message from %s:\n   Type: %s\n   Content: %s",
+                message.get('source', 'Unknown'),
+                message.get('type', 'unknown'),
+                message.get('payload', 'N/A')
+            )
+            
+            # Send acknowledgment
+            ack = encode_frame(self.node_id, message['source'], 'ack', 'received')
+            writer.write(LENGTH_PREFIX.pack(len(ack)) + ack)
+            await writer.drain()
             
-            if data:
-                message = json.loads(data)
-                print(f"\n📨 Message from {message.get('source', 'Unknown')}:")
-                print(f"   Type: {message.get('type', 'unknown')}")
-                print(f"   Content: {message.get('payload', 'N/A')}")
-                
-                # Send acknowledgment
-                response = {
-                    'status': 'received',
-                    'timestamp': datetime.now().isoformat()
-                }
-                client_socket.send(json.dumps(response).encode('utf-8'))
-                
         except Exception as e:
-            print(f"⚠️  Handler error: {e}")
+            log.warning("⚠️  Handler error: %s", e)
         finally:
-            client_socket.close()
+            self._peer_slots.release()
+            writer.close()
     
     def send_message_to_peer(self, peer_id, message_type, payload):
         """Send a message to a specific peer"""
@@ -201,24 +388,16 @@ class MeshNode:
             # Create socket connection
             sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             sock.settimeout(10)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
             sock.connect((peer['ip_address'], peer['port']))
             
-            # Prepare message
-            message = {
-                'source': self.node_id,
-                'destination': peer_id,
-                'type': message_type,
-                'payload': payload,
-                'timestamp': datetime.now().isoformat()
-            }
-            
             # Send message
-            sock.send(json.dumps(message).encode('utf-8'))
+            send_framed(sock, encode_frame(self.node_id, peer_id, message_type, payload))
             
             # Wait for response
-            response = sock.recv(4096).decode('utf-8')
+            response = decode_frame(recv_framed(sock))
             print(f"\n✅ Message sent to {peer_id}")
-            print(f"   Response: {response}")
+            print(f"   Response: {response['payload']} ({response['type']})")
             
             sock.close()
             return True
@@ -254,25 +433,37 @@ class MeshNode:
         print("\n🛑 Shutting down node...")
         self.running = False
         
+        # Drop pending ticks and wake the scheduler so its worker exits
+        for event in self._scheduler.queue:
+            try:
+                self._scheduler.cancel(event)
+            except ValueError:
+                pass
+        self._wakeup.set()
+        self._exec.shutdown(wait=False)
+        
         # Unregister from server
         try:
-            requests.post(
-                f"{self.server_url}/unregister",
-                json={'node_id': self.node_id},
-                timeout=5
+            self._post(
+                self._url_unreg,
+                {'node_id': self.node_id}
             )
             print("✅ Unregistered from server")
         except:
             pass
         
-        if self.server_socket:
-            self.server_socket.close()
+        self.http.close()
+        
+        if self._server and self._loop:
+            self._loop.call_soon_threadsafe(self._server.close)
         
         print("👋 Goodbye!")
 
 
 def main():
     """Main interactive loop"""
+    setup_logging()
+    
     # Configuration - DIFFERENT FROM NODE_ALPHA
     NODE_ID = "Node_Beta"
     SERVER_URL = "https://mobile-mesh-sentinel-production.up.railway.app"
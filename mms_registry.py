@@ -0,0 +1,170 @@
+"""
+Mobile Mesh Sentinel 2.0 - Node Registry
+Shared node state for the WSGI and ASGI signaling servers
+"""
+
+from datetime import datetime, timedelta
+import atexit
+import heapq
+import logging
+import logging.handlers
+import queue
+import secrets
+import time
+
+# Configuration
+HEARTBEAT_TIMEOUT = 30  # seconds
+CLEANUP_INTERVAL = 10   # seconds
+
+def setup_logging():
+    """Attach a queued handler to the 'mms' logger; a listener thread does the I/O"""
+    log = logging.getLogger('mms')
+    if log.handlers:
+        return log
+
+    log.setLevel(logging.INFO)
+    log.propagate = False
+    log_queue = queue.Queue(-1)
+    log.addHandler(logging.handlers.QueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(log_queue, logging.StreamHandler())
+    listener.start()
+    atexit.register(listener.stop)
+    return log
+
+class Node:
+    # Attributes are fixed after construction except last_heartbeat_monotonic
+    # (and the serialization cache keyed on it), which is replaced by a single
+    # reference assignment and is safe to read unlocked
+    def __init__(self, node_id, ip_address, port, public_key=None):
+        self.node_id = node_id
+        self.ip_address = ip_address
+        self.port = port
+        self.public_key = public_key
+        # Timeout arithmetic runs on the monotonic clock; wall-clock time is
+        # only kept for the human-readable last_seen
+        self.registered_at = datetime.now()
+        self.registered_monotonic = time.monotonic()
+        self.last_heartbeat_monotonic = self.registered_monotonic
+        self._cached_dict = None
+        self._cache_time = None
+
+    def touch(self):
+        """Record a heartbeat and drop the cached serialization"""
+        self.last_heartbeat_monotonic = time.monotonic()
+        self._cached_dict = None
+
+    def to_dict(self):
+        # Rebuilt only when the heartbeat moves; uptime is as of that heartbeat
+        last_heartbeat = self.last_heartbeat_monotonic
+        if self._cached_dict is not None and self._cache_time == last_heartbeat:
+            return self._cached_dict
+
+        uptime = last_heartbeat - self.registered_monotonic
+        node_dict = {
+            'node_id': self.node_id,
+            'ip_address': self.ip_address,
+            'port': self.port,
+            'public_key': self.public_key,
+            'last_seen': self.registered_at + timedelta(seconds=uptime),
+            'uptime_seconds': uptime
+        }
+        self._cache_time = last_heartbeat
+        self._cached_dict = node_dict
+        return node_dict
+
+class NodeRegistry:
+    """Active nodes, the membership version and the heartbeat deadline index
+
+    `lock` guards mutation and snapshotting only; callers serialize the
+    returned nodes outside it. The threaded server passes an RLock, the
+    single-loop ASGI server a contextlib.nullcontext().
+    """
+
+    def __init__(self, lock):
+        self._lock = lock
+        self._nodes = {}
+        # Opaque membership version: a per-process epoch plus a counter bumped
+        # whenever the registry gains or loses a node, so a value held across
+        # a server restart can never match by accident
+        self._epoch = secrets.token_hex(4)
+        self._changes = 0
+        self.version = f"{self._epoch}-0"
+        # Min-heap of (deadline, node_id) so expire() only visits expired
+        # entries; entries superseded by a later heartbeat are dropped lazily
+        self._deadlines = []
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def _bump_version(self):
+        self._changes += 1
+        self.version = f"{self._epoch}-{self._changes}"
+
+    def _push_deadline(self, node):
+        heapq.heappush(
+            self._deadlines,
+            (node.last_heartbeat_monotonic + HEARTBEAT_TIMEOUT, node.node_id)
+        )
+
+    def register(self, node_id, ip_address, port, public_key=None):
+        """Create or replace a node and return it"""
+        node = Node(node_id, ip_address, port, public_key)
+        with self._lock:
+            self._nodes[node_id] = node
+            self._bump_version()
+            self._push_deadline(node)
+        return node
+
+    def heartbeat(self, node_id):
+        """Touch a node; False if it is not registered"""
+        with self._lock:
+            node = self._nodes.get(node_id)
+            if node is None:
+                return False
+            node.touch()
+            self._push_deadline(node)
+        return True
+
+    def unregister(self, node_id):
+        """Remove a node; False if it is not registered"""
+        with self._lock:
+            if node_id not in self._nodes:
+                return False
+            del self._nodes[node_id]
+            self._bump_version()
+        return True
+
+    def nodes(self):
+        """Snapshot of all active nodes"""
+        with self._lock:
+            return list(self._nodes.values())
+
+    def peers_since(self, requesting_node, since_version):
+        """Return (version, peers), with peers None if nothing changed since since_version"""
+        with self._lock:
+            version = self.version
+            if since_version == version:
+                return version, None
+            peers = [
+                node
+                for node_id, node in self._nodes.items()
+                if node_id != requesting_node
+            ]
+        return version, peers
+
+    def expire(self):
+        """Drop nodes whose heartbeat is older than HEARTBEAT_TIMEOUT; return their ids"""
+        now = time.monotonic()
+        removed = []
+        with self._lock:
+            while self._deadlines and self._deadlines[0][0] < now:
+                _, node_id = heapq.heappop(self._deadlines)
+                node = self._nodes.get(node_id)
+                # Skip entries for nodes that have heartbeated (or left) since
+                if node and node.last_heartbeat_monotonic + HEARTBEAT_TIMEOUT < now:
+                    del self._nodes[node_id]
+                    removed.append(node_id)
+
+            if removed:
+                self._bump_version()
+        return removed
@@ -4,23 +4,44 @@ Phase 1: Node Registration & Discovery
 """
 
 from flask import Flask, request, jsonify
-from datetime import datetime, timedelta
-# ADD THIS LINE after the imports
+from flask.json.provider import JSONProvider
+from datetime import datetime
+from mms_registry import CLEANUP_INTERVAL, HEARTBEAT_TIMEOUT, NodeRegistry, setup_logging
+import orjson
 import os
 import threading
 import time
 
+# Request-path logging goes through a queue; a listener thread does the I/O
+log = setup_logging()
+
+class OrjsonProvider(JSONProvider):
+    """Route jsonify() and request.get_json() through orjson"""
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode('utf-8')
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        # Hand orjson's bytes straight to the response, skipping the str round trip
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj), mimetype='application/json')
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 
-# In-memory storage for active nodes
-active_nodes = {}
-node_lock = threading.Lock()
+# In-memory storage for active nodes; the lock guards mutation and
+# snapshotting only, serialization happens outside it
+registry = NodeRegistry(threading.RLock())
 
 # Configuration
-HEARTBEAT_TIMEOUT = 30  # seconds
-CLEANUP_INTERVAL = 10   # seconds
-# ADD THIS LINE after CLEANUP_INTERVAL = 10
 PORT = int(os.environ.get('PORT', 5000)) 
+# Bounded request pool; read here for waitress (python mms_signaling_server.py)
+# and passed to gunicorn as --threads / --worker-connections by Procfile.txt and nixpacks.toml
+THREADS = int(os.environ.get('MMS_THREADS', 8))
+CONN_LIMIT = int(os.environ.get('MMS_CONN_LIMIT', 512))
 
 @app.route('/')
 def index():
@@ -33,40 +54,22 @@ def index():
         'endpoints': {
             'health': '/health',
             'register': '/register (POST)',
-            'heartbeat': '/heartbeat (POST)',
+            'heartbeat': '/heartbeat/<node_id> (POST)',
+            'heartbeat_json': '/heartbeat (POST)',
             'discover': '/discover (POST)',
             'unregister': '/unregister (POST)',
             'nodes': '/nodes (GET)'
         },
-        'active_nodes': len(active_nodes),
-        'timestamp': datetime.now().isoformat()
+        'active_nodes': len(registry),
+        'timestamp': datetime.now()
     })
-class Node:
-    def __init__(self, node_id, ip_address, port, public_key=None):
-        self.node_id = node_id
-        self.ip_address = ip_address
-        self.port = port
-        self.public_key = public_key
-        self.last_heartbeat = datetime.now()
-        self.registered_at = datetime.now()
-    
-    def to_dict(self):
-        return {
-            'node_id': self.node_id,
-            'ip_address': self.ip_address,
-            'port': self.port,
-            'public_key': self.public_key,
-            'last_seen': self.last_heartbeat.isoformat(),
-            'uptime_seconds': (datetime.now() - self.registered_at).total_seconds()
-        }
-
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     return jsonify({
         'status': 'online',
-        'timestamp': datetime.now().isoformat(),
-        'active_nodes': len(active_nodes)
+        'timestamp': datetime.now(),
+        'active_nodes': len(registry)
     })
 
 @app.route('/register', methods=['POST'])
@@ -92,12 +95,10 @@ def register_node():
         if ',' in ip_address:
             ip_address = ip_address.split(',')[0].strip()
         
-        with node_lock:
-            # Create or update node
-            node = Node(node_id, ip_address, port, public_key)
-            active_nodes[node_id] = node
+        # Create or update node
+        node = registry.register(node_id, ip_address, port, public_key)
 
-        print(f"[REGISTER] {node_id} from {ip_address}:{port}")
+        log.info("[REGISTER] %s from %s:%s", node_id, ip_address, port)
         
         return jsonify({
             'success': True,
@@ -106,7 +107,7 @@ def register_node():
         }), 201
     
     except Exception as e:
-        print(f"[ERROR] Registration failed: {e}")
+        log.error("[ERROR] Registration failed: %s", e)
         return jsonify({
             'success': False,
             'error': str(e)
@@ -125,18 +126,16 @@ def heartbeat():
                 'error': 'node_id required'
             }), 400
         
-        with node_lock:
-            if node_id in active_nodes:
-                active_nodes[node_id].last_heartbeat = datetime.now()
-                return jsonify({
-                    'success': True,
-                    'message': 'Heartbeat received'
-                })
-            else:
-                return jsonify({
-                    'success': False,
-                    'error': 'Node not registered'
-                }), 404
+        if registry.heartbeat(node_id):
+            return jsonify({
+                'success': True,
+                'message': 'Heartbeat received'
+            })
+        else:
+            return jsonify({
+                'success': False,
+                'error': 'Node not registered'
+            }), 404
     
     except Exception as e:
         return jsonify({
@@ -144,12 +143,20 @@ def heartbeat():
             'error': str(e)
         }), 500
 
+@app.route('/heartbeat/<path:node_id>', methods=['POST'])
+def heartbeat_node(node_id):
+    """Bodyless heartbeat: node id in the path, empty 204/404 reply"""
+    if not registry.heartbeat(node_id):
+        return '', 404
+    return '', 204
+
 @app.route('/discover', methods=['POST'])
 def discover_peers():
     """Get list of active peers in the network"""
     try:
         data = request.get_json()
         requesting_node = data.get('node_id')
+        since_version = data.get('since_version')
         
         if not requesting_node:
             return jsonify({
@@ -157,18 +164,23 @@ def discover_peers():
                 'error': 'node_id required'
             }), 400
         
-        with node_lock:
-            # Return all active nodes except the requesting one
-            peers = [
-                node.to_dict() 
-                for node_id, node in active_nodes.items() 
-                if node_id != requesting_node
-            ]
+        # Snapshot all active nodes except the requesting one
+        version, snapshot = registry.peers_since(requesting_node, since_version)
+        if snapshot is None:
+            # Membership unchanged since the caller's last poll
+            return jsonify({
+                'success': True,
+                'unchanged': True,
+                'version': version
+            })
+        
+        peers = [node.to_dict() for node in snapshot]
         
         return jsonify({
             'success': True,
             'peer_count': len(peers),
-            'peers': peers
+            'peers': peers,
+            'version': version
         })
     
     except Exception as e:
@@ -190,19 +202,17 @@ def unregister_node():
                 'error': 'node_id required'
             }), 400
         
-        with node_lock:
-            if node_id in active_nodes:
-                del active_nodes[node_id]
-                print(f"[UNREGISTER] {node_id}")
-                return jsonify({
-                    'success': True,
-                    'message': f'Node {node_id} unregistered'
-                })
-            else:
-                return jsonify({
-                    'success': False,
-                    'error': 'Node not found'
-                }), 404
+        if registry.unregister(node_id):
+            log.info("[UNREGISTER] %s", node_id)
+            return jsonify({
+                'success': True,
+                'message': f'Node {node_id} unregistered'
+            })
+        else:
+            return jsonify({
+                'success': False,
+                'error': 'Node not found'
+            }), 404
     
     except Exception as e:
         return jsonify({
@@ -213,8 +223,7 @@ def unregister_node():
 @app.route('/nodes', methods=['GET'])
 def list_nodes():
     """List all active nodes (admin endpoint)"""
-    with node_lock:
-        nodes = [node.to_dict() for node in active_nodes.values()]
+    nodes = [node.to_dict() for node in registry.nodes()]
     
     return jsonify({
         'success': True,
@@ -227,18 +236,8 @@ def cleanup_stale_nodes():
     while True:
         time.sleep(CLEANUP_INTERVAL)
         
-        current_time = datetime.now()
-        timeout_threshold = current_time - timedelta(seconds=HEARTBEAT_TIMEOUT)
-        
-        with node_lock:
-            stale_nodes = [
-                node_id for node_id, node in active_nodes.items()
-                if node.last_heartbeat < timeout_threshold
-            ]
-            
-            for node_id in stale_nodes:
-                print(f"[CLEANUP] Removing stale node: {node_id}")
-                del active_nodes[node_id]
+        for node_id in registry.expire():
+            log.info("[CLEANUP] Removing stale node: %s", node_id)
 
 # Start cleanup thread
 cleanup_thread = threading.Thread(target=cleanup_stale_nodes, daemon=True)
@@ -252,6 +251,16 @@ if __name__ == '__main__':
     print(f"Port: {PORT}")
     print(f"Heartbeat timeout: {HEARTBEAT_TIMEOUT}s")
     print(f"Cleanup interval: {CLEANUP_INTERVAL}s")
+    print(f"Worker threads: {THREADS}")
+    print(f"Connection limit: {CONN_LIMIT}")
     print("=" * 60)
     
-    app.run(host='0.0.0.0', port=PORT, debug=False)
\ No newline at end of file
+    from waitress import serve
+    serve(
+        app,
+        host='0.0.0.0',
+        port=PORT,
+        threads=THREADS,
+        connection_limit=CONN_LIMIT,
+        channel_timeout=30
+    )
\ No newline at end of file
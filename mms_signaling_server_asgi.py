@@ -0,0 +1,266 @@
+"""
+Mobile Mesh Sentinel 2.0 - Signaling Server (ASGI)
+Phase 1: Node Registration & Discovery on a single asyncio event loop
+
+Same routes and responses as mms_signaling_server.py, served by Starlette:
+    uvicorn mms_signaling_server_asgi:app --loop uvloop --http httptools --workers 1 --port 5000
+Keep --workers at 1: node state lives in this process.
+"""
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+from contextlib import asynccontextmanager, nullcontext
+from datetime import datetime
+from mms_registry import CLEANUP_INTERVAL, HEARTBEAT_TIMEOUT, NodeRegistry, setup_logging
+import orjson
+import asyncio
+import os
+
+# Request-path logging goes through a queue; a listener thread does the I/O
+log = setup_logging()
+
+class ORJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson"""
+
+    def render(self, content):
+        return orjson.dumps(content)
+
+# In-memory storage for active nodes. Every handler runs on the one event
+# loop and never awaits while touching the registry, so no lock is needed.
+registry = NodeRegistry(nullcontext())
+
+# Configuration
+PORT = int(os.environ.get('PORT', 5000))
+
+async def index(request):
+    """Root endpoint - Service information"""
+    return ORJSONResponse({
+        'service': 'Mobile Mesh Sentinel 2.0 - Signaling Server',
+        'status': 'online',
+        'version': '2.0',
+        'deployment': 'Railway Cloud',
+        'endpoints': {
+            'health': '/health',
+            'register': '/register (POST)',
+            'heartbeat': '/heartbeat/<node_id> (POST)',
+            'heartbeat_json': '/heartbeat (POST)',
+            'discover': '/discover (POST)',
+            'unregister': '/unregister (POST)',
+            'nodes': '/nodes (GET)'
+        },
+        'active_nodes': len(registry),
+        'timestamp': datetime.now()
+    })
+
+async def health_check(request):
+    """Health check endpoint"""
+    return ORJSONResponse({
+        'status': 'online',
+        'timestamp': datetime.now(),
+        'active_nodes': len(registry)
+    })
+
+async def register_node(request):
+    """Register a new node in the mesh network"""
+    try:
+        data = orjson.loads(await request.body())
+
+        # Validate required fields
+        required_fields = ['node_id', 'port']
+        if not all(field in data for field in required_fields):
+            return ORJSONResponse({
+                'success': False,
+                'error': 'Missing required fields: node_id, port'
+            }, status_code=400)
+
+        node_id = data['node_id']
+        port = data['port']
+        public_key = data.get('public_key', None)
+
+        # Get client IP; ASGI servers may not report a client address
+        client_host = request.client.host if request.client else None
+        ip_address = request.headers.get('X-Forwarded-For', client_host)
+        if not ip_address:
+            return ORJSONResponse({
+                'success': False,
+                'error': 'Cannot determine client address'
+            }, status_code=400)
+        if ',' in ip_address:
+            ip_address = ip_address.split(',')[0].strip()
+
+        # Create or update node
+        node = registry.register(node_id, ip_address, port, public_key)
+
+        log.info("[REGISTER] %s from %s:%s", node_id, ip_address, port)
+
+        return ORJSONResponse({
+            'success': True,
+            'message': f'Node {node_id} registered successfully',
+            'node_info': node.to_dict()
+        }, status_code=201)
+
+    except Exception as e:
+        log.error("[ERROR] Registration failed: %s", e)
+        return ORJSONResponse({
+            'success': False,
+            'error': str(e)
+        }, status_code=500)
+
+async def heartbeat(request):
+    """Update node's last seen timestamp"""
+    try:
+        data = orjson.loads(await request.body())
+        node_id = data.get('node_id')
+
+        if not node_id:
+            return ORJSONResponse({
+                'success': False,
+                'error': 'node_id required'
+            }, status_code=400)
+
+        if not registry.heartbeat(node_id):
+            return ORJSONResponse({
+                'success': False,
+                'error': 'Node not registered'
+            }, status_code=404)
+
+        return ORJSONResponse({
+            'success': True,
+            'message': 'Heartbeat received'
+        })
+
+    except Exception as e:
+        return ORJSONResponse({
+            'success': False,
+            'error': str(e)
+        }, status_code=500)
+
+async def heartbeat_node(request):
+    """Bodyless heartbeat: node id in the path, empty 204/404 reply"""
+    if not registry.heartbeat(request.path_params['node_id']):
+        return Response(status_code=404)
+    return Response(status_code=204)
+
+async def discover_peers(request):
+    """Get list of active peers in the network"""
+    try:
+        data = orjson.loads(await request.body())
+        requesting_node = data.get('node_id')
+        since_version = data.get('since_version')
+
+        if not requesting_node:
+            return ORJSONResponse({
+                'success': False,
+                'error': 'node_id required'
+            }, status_code=400)
+
+        # Snapshot all active nodes except the requesting one
+        version, snapshot = registry.peers_since(requesting_node, since_version)
+        if snapshot is None:
+            # Membership unchanged since the caller's last poll
+            return ORJSONResponse({
+                'success': True,
+                'unchanged': True,
+                'version': version
+            })
+
+        peers = [node.to_dict() for node in snapshot]
+
+        return ORJSONResponse({
+            'success': True,
+            'peer_count': len(peers),
+            'peers': peers,
+            'version': version
+        })
+
+    except Exception as e:
+        return ORJSONResponse({
+            'success': False,
+            'error': str(e)
+        }, status_code=500)
+
+async def unregister_node(request):
+    """Manually unregister a node"""
+    try:
+        data = orjson.loads(await request.body())
+        node_id = data.get('node_id')
+
+        if not node_id:
+            return ORJSONResponse({
+                'success': False,
+                'error': 'node_id required'
+            }, status_code=400)
+
+        if registry.unregister(node_id):
+            log.info("[UNREGISTER] %s", node_id)
+            return ORJSONResponse({
+                'success': True,
+                'message': f'Node {node_id} unregistered'
+            })
+        else:
+            return ORJSONResponse({
+                'success': False,
+                'error': 'Node not found'
+            }, status_code=404)
+
+    except Exception as e:
+        return ORJSONResponse({
+            'success': False,
+            'error': str(e)
+        }, status_code=500)
+
+async def list_nodes(request):
+    """List all active nodes (admin endpoint)"""
+    nodes = [node.to_dict() for node in registry.nodes()]
+
+    return ORJSONResponse({
+        'success': True,
+        'total_nodes': len(nodes),
+        'nodes': nodes
+    })
+
+async def cleanup_stale_nodes():
+    """Background task to remove inactive nodes"""
+    while True:
+        await asyncio.sleep(CLEANUP_INTERVAL)
+
+        for node_id in registry.expire():
+            log.info("[CLEANUP] Removing stale node: %s", node_id)
+
+@asynccontextmanager
+async def lifespan(app):
+    """Run the cleanup task for the lifetime of the server"""
+    cleanup_task = asyncio.create_task(cleanup_stale_nodes())
+    try:
+        yield
+    finally:
+        cleanup_task.cancel()
+
+app = Starlette(
+    routes=[
+        Route('/', index),
+        Route('/health', health_check, methods=['GET']),
+        Route('/register', register_node, methods=['POST']),
+        Route('/heartbeat', heartbeat, methods=['POST']),
+        Route('/heartbeat/{node_id:path}', heartbeat_node, methods=['POST']),
+        Route('/discover', discover_peers, methods=['POST']),
+        Route('/unregister', unregister_node, methods=['POST']),
+        Route('/nodes', list_nodes, methods=['GET']),
+    ],
+    lifespan=lifespan
+)
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("Mobile Mesh Sentinel 2.0 - Signaling Server (ASGI)")
+    print("=" * 60)
+    print(f"Deployment: Railway Cloud")
+    print(f"Port: {PORT}")
+    print(f"Heartbeat timeout: {HEARTBEAT_TIMEOUT}s")
+    print(f"Cleanup interval: {CLEANUP_INTERVAL}s")
+    print("=" * 60)
+
+    import uvicorn
+    # 'auto' picks uvloop/httptools when installed (uvicorn[standard])
+    uvicorn.run(app, host='0.0.0.0', port=PORT, loop='auto', http='auto', workers=1)